@@ -1,10 +1,9 @@
 import argparse
 import logging
 import json
-import yaml
 import os
+import sys
 
-from logging.handlers import RotatingFileHandler
 from pathlib import Path
 from datetime import timedelta
 
@@ -19,6 +18,8 @@ DEFAULT_CONFIGS = {
     "output-path": "./app-logs/gcp-transformer.log",
 }
 
+CONFIG_READ_SIZE = 64 * 1024
+
 
 class Options:
     source_files: list[str]
@@ -51,6 +52,8 @@ class Options:
         self.output_path = output_path
 
         self.configure_logging(log_level)
+        self._as_dict = self._build_dict()
+        self._as_json = json.dumps(self._as_dict, indent=4)
 
     def configure_logging(self, log_level: str):
         lvl = getattr(logging, log_level.upper(), logging.INFO)
@@ -83,13 +86,15 @@ class Options:
                     )
                     return
             try:
-                output_path.open("w", encoding="utf-8")
+                from logging.handlers import RotatingFileHandler
+
                 output_file = RotatingFileHandler(
                     filename=str(output_path),
                     mode="a",
-                    maxBytes=10 * 1024 * 1024,
+                    maxBytes=64 * 1024 * 1024,
                     backupCount=5,
                     encoding="utf-8",
+                    delay=True,
                 )
                 output_file.setLevel(lvl)
                 output_file.setFormatter(formater)
@@ -103,15 +108,18 @@ class Options:
                 )
 
     def __repr__(self):
-        return json.dumps(self.to_dict(), indent=4)
+        return self._as_json
 
     def __str__(self):
         return self.__repr__()
 
     def to_dict(self):
+        return self._as_dict
+
+    def _build_dict(self):
         return {
             "source_files": self.source_files,
-            "aggregation_interval": self.agg_interval.seconds.__str__() + "s",
+            "aggregation_interval": str(self.agg_interval.total_seconds()) + "s",
             "prune_interval": self.prune_interval.__str__() + "s",
             "log_level": logging.getLevelName(logging.getLogger().level),
             "console_logging": self.console_log,
@@ -124,17 +132,24 @@ def load_yaml_config(file_path: str | Path):
     path = Path(file_path).expanduser()
     if not path.exists():
         raise FileNotFoundError(f"Config file not found: {file_path}")
+
+    import yaml
+
+    # The flat config fits well within one read; larger files are read in
+    # full rather than parsed from a truncated document.
     with path.open("r", encoding="utf-8") as f:
-        config_data = yaml.safe_load(f)
+        content = f.read(CONFIG_READ_SIZE)
+        if len(content) == CONFIG_READ_SIZE:
+            content += f.read()
+
+    loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+    config_data = yaml.load(content, Loader=loader)
     if not isinstance(config_data, dict):
         raise ValueError(f"Invalid config format in file: {file_path}")
-    return config_data
+    return {key: config_data[key] for key in DEFAULT_CONFIGS if key in config_data}
 
 
-def parse_arguments():
-    parser = argparse.ArgumentParser(
-        description="Process source files with specified interval and logging level."
-    )
+def add_config_argument(parser: argparse.ArgumentParser):
     parser.add_argument(
         "--config-file",
         "-c",
@@ -142,6 +157,23 @@ def parse_arguments():
         help="Path to config file, if provided, it overrides the provided default options.",
     )
 
+
+def parse_config_argument():
+    """
+    Parses only '--config-file' so the full argument set is built only when
+    the config file cannot be used. Also returns the arguments left over.
+    """
+    parser = argparse.ArgumentParser(add_help=False)
+    add_config_argument(parser)
+    return parser.parse_known_args()
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(
+        description="Process source files with specified interval and logging level."
+    )
+    add_config_argument(parser)
+
     parser.add_argument(
         "--source-files",
         "-s",
@@ -207,7 +239,13 @@ def parse_arguments():
 
 
 def parse_options():
-    args = parse_arguments()
+    args, remaining = parse_config_argument()
+    fully_parsed = bool(remaining) or "-h" in sys.argv[1:] or "--help" in sys.argv[1:]
+    if fully_parsed:
+        # Any other argument goes through the full parser so that help is
+        # shown and mistakes are still reported.
+        args = parse_arguments()
+
     if args.config_file:
         try:
             config_data = load_yaml_config(args.config_file)
@@ -225,6 +263,8 @@ def parse_options():
         except Exception as _:
             pass
 
+    if not fully_parsed:
+        args = parse_arguments()
     return Options(
         files=args.source_files,
         agg_interval=timedelta(seconds=args.agg_interval),
@@ -1,103 +1,542 @@
+import asyncio
+import contextlib
+import fnmatch
 import glob
 import logging
 import os
-import threading
+import re
 import time
 
-from datetime import datetime
 from pathlib import Path
-from typing import Dict, Any, TextIO
+from typing import Callable, Dict, Iterator, List, Optional, Pattern, Tuple, Union
 from config import Options
+from files_io import AggregatedWriter, dump_log_to_file
+from parser import format_timestamp, parse_log_entry, process_log
 
 logger = logging.getLogger(__name__)
 
-CacheTree = Dict[Path, Dict[str, Any]]
-FilesMap = Dict[Path, TextIO]
+
+Segment = Union[str, Pattern[str]]
+
+
+def _compile_pattern(pattern: str) -> Tuple[str, List[Segment], bool]:
+    """
+    Splits a glob pattern into its root and per-directory segments: '**',
+    a literal name, or a regex compiled from the wildcard segment. Like
+    glob, wildcards only match hidden names when the segment starts with '.'.
+    """
+    drive, rest = os.path.splitdrive(pattern)
+    if os.altsep:
+        rest = rest.replace(os.altsep, os.sep)
+    root = drive + os.sep if rest.startswith(os.sep) else drive
+    flags = re.IGNORECASE if os.path.normcase("A") == "a" else 0
+
+    parts: List[Segment] = []
+    for part in rest.split(os.sep):
+        if not part:
+            continue
+        if part == "**" or not glob.has_magic(part):
+            parts.append(part)
+        else:
+            regex = fnmatch.translate(part)
+            if not part.startswith("."):
+                regex = r"(?!\.)" + regex
+            parts.append(re.compile(regex, flags))
+    return root, parts, rest.endswith(os.sep)
+
+
+# Coarse-timestamp filesystems (FAT, SMB) can report directory mtimes with
+# up to 2 s granularity.
+RACY_MTIME_WINDOW_NS = 2 * 1_000_000_000
+
+
+class GlobCache:
+    """
+    Expands glob patterns like glob.glob(recursive=True) with an os.scandir
+    walk, but remembers the listing of every scanned directory and only
+    re-reads it when the directory's mtime changes. Pattern segments are
+    compiled once and resolved paths are kept between calls too.
+    """
+
+    def __init__(self):
+        self._dirs: Dict[str, Tuple[int, List[Tuple[str, bool]]]] = {}
+        self._patterns: Dict[str, Tuple[str, List[Segment], bool]] = {}
+        self._resolved: Dict[str, Path] = {}
+
+    def glob(
+        self,
+        pattern: str,
+        exclude: Optional[Callable[[str], bool]] = None,
+    ) -> Iterator[str]:
+        """
+        Yields the paths matching `pattern`, skipping matched names for
+        which `exclude` returns True.
+        """
+        compiled = self._patterns.get(pattern)
+        if compiled is None:
+            compiled = self._patterns[pattern] = _compile_pattern(pattern)
+
+        root, parts, dirs_only = compiled
+        matched = self._match(root, parts, exclude)
+        if dirs_only:
+            # Like glob, a trailing separator in the pattern is kept on the
+            # matched directories.
+            return (os.path.join(p, "") for p in matched if os.path.isdir(p))
+        return matched
+
+    def resolve_all(self, files: List[str]) -> List[Path]:
+        resolved = {}
+        for file in files:
+            path = self._resolved.get(file)
+            if path is None:
+                path = Path(file).resolve()
+            resolved[file] = path
+        self._resolved = resolved
+        return list(dict.fromkeys(resolved.values()))
+
+    def _match(
+        self,
+        base: str,
+        parts: List[Segment],
+        exclude: Optional[Callable[[str], bool]],
+    ) -> Iterator[str]:
+        if not parts:
+            yield base
+            return
+
+        head, rest = parts[0], parts[1:]
+        if head == "**":
+            if rest:
+                yield from self._match(base, rest, exclude)
+            elif base and os.path.isdir(base):
+                # glob yields the directory a trailing '**' starts from
+                # with a separator appended, e.g. 'logs/' for 'logs/**', but
+                # unlike glob only when that directory exists.
+                yield os.path.join(base, "")
+            yield from self._descend(base, rest, exclude)
+        elif isinstance(head, str):
+            path = os.path.join(base, head)
+            if rest:
+                yield from self._match(path, rest, exclude)
+            elif not (exclude and exclude(head)) and os.path.lexists(path):
+                yield path
+        else:
+            for name, is_dir in self._entries(base):
+                if rest and not is_dir:
+                    continue
+                if not head.match(name):
+                    continue
+                if not rest and exclude and exclude(name):
+                    continue
+                yield from self._match(os.path.join(base, name), rest, exclude)
+
+    def _descend(
+        self,
+        base: str,
+        rest: List[Segment],
+        exclude: Optional[Callable[[str], bool]],
+    ) -> Iterator[str]:
+        """
+        Matches `rest` in every non-hidden directory below `base`, or yields
+        everything below it when `rest` is empty.
+        """
+        for name, is_dir in self._entries(base):
+            if name.startswith("."):
+                continue
+            path = os.path.join(base, name)
+            if is_dir:
+                if rest:
+                    yield from self._match(path, rest, exclude)
+                else:
+                    yield path
+                yield from self._descend(path, rest, exclude)
+            elif not rest and not (exclude and exclude(name)):
+                yield path
+
+    def _entries(self, directory: str) -> List[Tuple[str, bool]]:
+        directory = directory or os.curdir
+        try:
+            mtime = os.stat(directory).st_mtime_ns
+        except OSError:
+            self._dirs.pop(directory, None)
+            return []
+
+        cached = self._dirs.get(directory)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+
+        entries = []
+        try:
+            with os.scandir(directory) as it:
+                for entry in it:
+                    try:
+                        is_dir = entry.is_dir()
+                    except OSError:
+                        is_dir = False
+                    entries.append((entry.name, is_dir))
+        except OSError:
+            return []
+
+        # A directory modified within the mtime granularity of the scan may
+        # still gain entries without its mtime changing, so only listings
+        # that are older than that are trusted on later calls.
+        if time.time_ns() - mtime >= RACY_MTIME_WINDOW_NS:
+            self._dirs[directory] = (mtime, entries)
+        else:
+            self._dirs.pop(directory, None)
+        return entries
+
+
+class MessageCache:
+    """
+    Aggregation state of a single source file, kept as parallel mappings
+    from a message to its count and first-seen time
+    (time.monotonic() seconds). Messages must be added in time order.
+    """
+
+    __slots__ = ("counts", "first_seen")
+
+    def __init__(self):
+        self.counts: Dict[str, int] = {}
+        self.first_seen: Dict[str, float] = {}
+
+    def __len__(self) -> int:
+        return len(self.counts)
+
+    def add(self, message: str, now: float):
+        self.counts[message] = 1
+        self.first_seen[message] = now
+
+    def pop(self, message: str) -> int:
+        del self.first_seen[message]
+        return self.counts.pop(message)
+
+    def sweep(self, threshold: float) -> list[Tuple[str, int]]:
+        """
+        Removes every message first seen before `threshold` and returns the
+        (message, count) pairs. Messages are inserted with increasing
+        monotonic times, so the expired ones are always a prefix of
+        `first_seen` and the scan stops at the first live entry.
+        """
+        expired = []
+        for message, first_seen in self.first_seen.items():
+            if first_seen >= threshold:
+                break
+            expired.append(message)
+        return [(message, self.pop(message)) for message in expired]
+
+
+CacheTree = Dict[Path, MessageCache]
+FilesMap = Dict[Path, AggregatedWriter]
 
 
 def discover_files(
-        patterns: list[str]
+        patterns: list[str],
+        glob_cache: Optional[GlobCache] = None,
     ) -> list[Path]:
     """
     Finds all files matching the given glob pattern.
 
     Args:
         pattern (str): A glob pattern (e.g., 'service_*/*.log').
+        glob_cache (GlobCache): Directory listings kept between calls.
 
     Returns:
         A list of full paths to the matched files.
     """
-    discovered: list[Path] = []
+    glob_cache = glob_cache or GlobCache()
+    matched: list[str] = []
     for pattern in patterns:
-        matched = glob.glob(pattern, recursive=True)
-        for file in matched:
-            p = Path(file).resolve()
-            if "-agg" not in p.stem:
-                discovered.append(p)
-    return discovered
+        matched.extend(glob_cache.glob(pattern, exclude=_is_aggregated))
+    return glob_cache.resolve_all(matched)
 
 
-def dump_log_to_file(source_file: Path, timestamp: str, message: str):
-    destination = source_file.parent / f"{source_file.stem}-agg.log"
-    try:
-        with destination.open("a", encoding="utf-8") as f:
-            f.write(f"[{timestamp}] " + message + "\n")
-    except Exception as e:
-        logger.error(f"Failed to append to file {destination} ({source_file}): {e}")
+def _is_aggregated(name: str) -> bool:
+    stem = name.rpartition(".")[0] or name
+    return "-agg" in stem
+
+
+class TailedFile:
+    """
+    A monitored source file, opened at its end, together with the buffered
+    writer of its aggregated log.
+    """
+
+    def __init__(self, file_path: Path):
+        self.path = file_path
+        self.fd = os.open(file_path, os.O_RDONLY | getattr(os, "O_BINARY", 0))
+        try:
+            os.lseek(self.fd, 0, os.SEEK_END)
+            self.writer = AggregatedWriter(file_path)
+        except Exception:
+            os.close(self.fd)
+            raise
+        self.pending = b""
+        self.wd: Optional[int] = None
+
+    def read_lines(self, size: int = 64 * 1024) -> Optional[list[bytes]]:
+        """
+        Reads the next chunk of the file and returns the complete lines in
+        it, or None at end of file. A trailing partial line is kept until
+        the rest of it arrives.
+        """
+        data = os.read(self.fd, size)
+        if not data:
+            return None
+        lines = (self.pending + data).split(b"\n")
+        self.pending = lines.pop()
+        return lines
+
+    def close(self):
+        self.writer.close()
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
 
 
 def tail_file(
-        file_path: Path, 
-        cache_map: CacheTree, 
-        cache_map_lock: threading.Lock,
-        opts: Options, 
-        stop_event: threading.Event
-    ):
+        tailed: TailedFile,
+        cache_map: CacheTree,
+        opts: Options,
+        max_chunks: int = 16,
+    ) -> bool:
+    """
+    Reads up to `max_chunks` chunks of new data from a monitored file,
+    processes every complete log entry in them, then flushes its aggregated
+    log. Returns True when the limit was hit before end of file, so the
+    caller can come back to it after letting other tasks run.
+    """
+    file_path = tailed.path
+    writer = tailed.writer
+    agg_window = opts.agg_interval.total_seconds()
+    cache = cache_map.get(file_path)
+    if cache is None:
+        cache = cache_map[file_path] = MessageCache()
+    counts = cache.counts
+    # Message of the previous line while it is still cached, so
+    # back-to-back repeats only bump the count; the window check for them
+    # is left to the next distinct line or the pruner.
+    last_message = None
+    # Local aliases for the names used on every line.
+    parse, monotonic = parse_log_entry, time.monotonic
+
+    reached_eof = False
+    for _ in range(max_chunks):
+        lines = tailed.read_lines()
+        if lines is None:
+            reached_eof = True
+            break
+
+        for line in lines:
+            timestamp, message = parse(line)
+            if not message:
+                continue
+
+            if message == last_message:
+                counts[message] += 1
+            elif message in counts:
+                process_log(
+                    cache=cache,
+                    message=message,
+                    agg_window=agg_window,
+                    source_file=file_path,
+                    writer=writer,
+                )
+                last_message = message if message in counts else None
+            else:
+                last_message = message
+                cache.add(message, monotonic())
+                dump_log_to_file(
+                    source_file=file_path,
+                    timestamp=format_timestamp(timestamp),
+                    message=message,
+                    writer=writer,
+                )
+                logger.debug(f"New entry for {file_path}: '{message}'")
+
+    writer.flush()
+    return not reached_eof
+
+
+class FileTailer:
     """
-    Tails a single file for new log entries and processes them.
-    This function is executed in its own thread for each monitored file.
+    Tails every monitored file from a task on the running event loop. On
+    Linux with `inotify_simple` installed the task sleeps until a file is
+    modified; elsewhere it polls all files every `opts.time_wait` seconds.
     """
-    from parser import parse_log_entry, process_log
 
-    logger = logging.getLogger(__name__)
-    logger.debug(f"Worker started for: {file_path}")
-    
+    def __init__(
+        self,
+        cache_map: CacheTree,
+        opts: Options,
+        files_map: FilesMap,
+        idle_timeout: float = 1.0,
+    ):
+        self.cache_map = cache_map
+        self.opts = opts
+        self.files_map = files_map
+        self.idle_timeout = float(idle_timeout)
+        self._inotify = _open_inotify()
+        self._active: Dict[Path, TailedFile] = {}
+        # Files whose last drain stopped before end of file.
+        self._backlog: Dict[Path, TailedFile] = {}
+        self._changed = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(
+                self._worker(), name="log-file-tailer"
+            )
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+
+    def is_watching(self, file_path: Path) -> bool:
+        return file_path in self._active
+
+    def watched(self) -> set[Path]:
+        return set(self._active)
+
+    def watch(self, file_path: Path):
+        """
+        Starts tailing `file_path` from its current end.
+        """
+        try:
+            tailed = TailedFile(file_path)
+        except FileNotFoundError:
+            logger.warning(f"File not found: {file_path}. It will not be tailed.")
+            return
+        except Exception as e:
+            logger.error(f"Error opening file {file_path}: {e}", exc_info=True)
+            return
+
+        if self._inotify is not None:
+            from inotify_simple import flags
+
+            try:
+                tailed.wd = self._inotify.add_watch(file_path, flags.MODIFY)
+            except OSError as e:
+                logger.warning(f"Unable to watch {file_path}, polling it: {e}")
+
+        self.unwatch(file_path)
+        self._active[file_path] = tailed
+        self.files_map[file_path] = tailed.writer
+        logger.debug(f"Tailing started for: {file_path}")
+
+    def unwatch(self, file_path: Path):
+        tailed = self._active.pop(file_path, None)
+        if tailed is None:
+            return
+        if self.files_map.get(file_path) is tailed.writer:
+            del self.files_map[file_path]
+        if tailed.wd is not None:
+            try:
+                self._inotify.rm_watch(tailed.wd)
+            except OSError:
+                pass
+        tailed.close()
+        logger.debug(f"Stopping tail for file: {file_path}")
+
+    async def _worker(self):
+        loop = asyncio.get_running_loop()
+        if self._inotify is not None:
+            loop.add_reader(self._inotify.fileno(), self._changed.set)
+        try:
+            while True:
+                for tailed in await self._wait_for_changes():
+                    self._tail(tailed)
+        finally:
+            if self._inotify is not None:
+                loop.remove_reader(self._inotify.fileno())
+            for file_path in list(self._active):
+                self.unwatch(file_path)
+            if self._inotify is not None:
+                self._inotify.close()
+                self._inotify = None
+
+    async def _wait_for_changes(self) -> list[TailedFile]:
+        if self._backlog:
+            # Yield once so discovery, the pruner and other files get a turn
+            # between bounded drains of a busy file.
+            await asyncio.sleep(0)
+            return self._take_backlog()
+
+        if self._inotify is None:
+            await asyncio.sleep(self.opts.time_wait)
+            return list(self._active.values())
+
+        has_polled = any(t.wd is None for t in self._active.values())
+        timeout = self.opts.time_wait if has_polled else self.idle_timeout
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            self._flush_idle()
+            return self._polled()
+
+        return list(self._read_events().values()) + self._polled()
+
+    def _read_events(self) -> Dict[Path, TailedFile]:
+        self._changed.clear()
+        by_wd = {t.wd: t for t in self._active.values() if t.wd is not None}
+        events = self._inotify.read(timeout=0)
+        return {by_wd[e.wd].path: by_wd[e.wd] for e in events if e.wd in by_wd}
+
+    def _polled(self) -> list[TailedFile]:
+        return [t for t in self._active.values() if t.wd is None]
+
+    def _take_backlog(self) -> list[TailedFile]:
+        """
+        Returns the backlogged files that are still watched, plus any file
+        that changed or is due a poll in the meantime.
+        """
+        backlog, self._backlog = self._backlog, {}
+        changed = {
+            path: tailed
+            for path, tailed in backlog.items()
+            if self._active.get(path) is tailed
+        }
+        if self._inotify is None:
+            changed.update(self._active)
+            return list(changed.values())
+
+        if self._changed.is_set():
+            changed.update(self._read_events())
+        for tailed in self._polled():
+            changed.setdefault(tailed.path, tailed)
+        return list(changed.values())
+
+    def _flush_idle(self):
+        """
+        Flushes every writer while no file is changing, so lines written
+        from elsewhere (e.g. pruner reports) are not held in the buffer.
+        """
+        for tailed in list(self._active.values()):
+            try:
+                tailed.writer.flush()
+            except OSError as e:
+                logger.error(f"Failed to flush aggregated log for {tailed.path}: {e}")
+
+    def _tail(self, tailed: TailedFile):
+        try:
+            if tail_file(tailed, self.cache_map, self.opts):
+                self._backlog[tailed.path] = tailed
+        except Exception as e:
+            logger.error(f"Error processing file {tailed.path}: {e}", exc_info=True)
+            self.unwatch(tailed.path)
+
+
+def _open_inotify():
     try:
-        with open(file_path, 'r') as file_obj:
-            file_obj.seek(0, os.SEEK_END)
-            
-            while not stop_event.is_set():
-                line = file_obj.readline()
-                if line:
-                    timestamp, message = parse_log_entry(line)
-                    if message:
-                        with cache_map_lock:
-                            cache = cache_map.setdefault(file_path, {})
-
-                        if message in cache:
-                            process_log(
-                                cache=cache,
-                                message=message,
-                                agg_window=opts.agg_interval,
-                                source_file=file_path,
-                            )
-                        else:
-                            dump_log_to_file(
-                                source_file=file_path,
-                                timestamp=timestamp.strftime("%Y-%m-%d %H:%M:%S"),
-                                message=message,
-                            )
-                            cache[message] = {
-                                "count": 1,
-                                "first_seen": datetime.now(),
-                            }
-                            logger.debug(f"New entry for {file_path}: '{message}'")
-                else:
-                    time.sleep(opts.time_wait)
-
-    except FileNotFoundError:
-        logger.warning(f"File not found: {file_path}. Thread will exit.")
-    except Exception as e:
-        logger.error(f"Error processing file {file_path}: {e}", exc_info=True)
-    finally:
-        logger.debug(f"Stopping tail for file: {file_path}")
\ No newline at end of file
+        from inotify_simple import INotify
+    except ImportError:
+        return None
+
+    try:
+        return INotify()
+    except OSError as e:
+        logger.warning(f"inotify unavailable, falling back to polling: {e}")
+        return None
@@ -0,0 +1,113 @@
+import logging
+import os
+import time
+
+from pathlib import Path
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+class AggregatedWriter:
+    """
+    Keeps the '-agg.log' companion of a source file open for appending and
+    batches writes in one reusable buffer, flushing it every `flush_every`
+    lines, `buffer_size` bytes or `flush_interval` seconds with os.write.
+    """
+
+    def __init__(
+        self,
+        source_file: Path,
+        flush_every: int = 64,
+        flush_interval: float = 1.0,
+        buffer_size: int = 64 * 1024,
+    ):
+        self.destination = aggregated_path(source_file)
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self.buffer_size = buffer_size
+        self._fd: Optional[int] = os.open(
+            self.destination,
+            os.O_WRONLY | os.O_APPEND | os.O_CREAT | getattr(os, "O_BINARY", 0),
+            0o644,
+        )
+        self._buffer = bytearray()
+        self._pending = 0
+        self._last_flush = time.monotonic()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    @property
+    def closed(self) -> bool:
+        return self._fd is None
+
+    def write(self, timestamp: str, message: str):
+        self._buffer += format_line(timestamp, message)
+        self._pending += 1
+        if (
+            self._pending >= self.flush_every
+            or len(self._buffer) >= self.buffer_size
+            or time.monotonic() - self._last_flush >= self.flush_interval
+        ):
+            self._flush()
+
+    def flush(self):
+        if self._pending:
+            self._flush()
+
+    def close(self):
+        if self._fd is not None:
+            try:
+                self.flush()
+            finally:
+                os.close(self._fd)
+                self._fd = None
+
+    def _flush(self):
+        self._pending = 0
+        self._last_flush = time.monotonic()
+        view = memoryview(self._buffer)
+        try:
+            written = 0
+            while written < len(view):
+                written += os.write(self._fd, view[written:])
+        finally:
+            view.release()
+            self._buffer.clear()
+
+
+def format_line(timestamp: str, message: str) -> bytes:
+    """
+    Encodes one aggregated log line. Lines always end in a bare LF,
+    whichever path writes them.
+    """
+    return f"[{timestamp}] {message}\n".encode()
+
+
+def aggregated_path(source_file: Path) -> Path:
+    return source_file.parent / f"{source_file.stem}-agg.log"
+
+
+def dump_log_to_file(
+        source_file: Path,
+        timestamp: str,
+        message: str,
+        writer: Optional[AggregatedWriter] = None,
+    ):
+    """
+    Appends a line to the aggregated log of `source_file`, going through
+    `writer` when the file's buffered writer is open.
+    """
+    try:
+        if writer is not None and not writer.closed:
+            writer.write(timestamp, message)
+            return
+
+        with aggregated_path(source_file).open("ab") as f:
+            f.write(format_line(timestamp, message))
+    except Exception as e:
+        logger.error(f"Failed to append aggregated log for {source_file}: {e}")
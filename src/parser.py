@@ -1,60 +1,146 @@
 import logging
+import re
+import time
 
-from datetime import datetime, timedelta
+from datetime import datetime
 from pathlib import Path
-from dateutil.parser import parse as parse_datetime
+from typing import TYPE_CHECKING, Optional
+from files_io import AggregatedWriter, dump_log_to_file
+
+if TYPE_CHECKING:
+    from files import MessageCache
 
 logger = logging.getLogger(__name__)
 
+# '[timestamp] message' with surrounding whitespace dropped. The first group
+# only matches timestamps already laid out as TIMESTAMP_FORMAT, the second
+# any other timestamp; the message group is None when nothing follows.
+_LINE_RE = re.compile(
+    rb"\s*\[(?:(\d{4}-\d\d-\d\d \d\d:\d\d:\d\d)|([^\]]*))\]\s*(.*\S)?\s*$"
+)
+
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# (timestamp_str, datetime) of the most recently parsed timestamp.
+_last_timestamp: tuple = (None, None)
+# (datetime, tzinfo, str) of the most recently formatted log timestamp.
+_last_formatted: tuple = (None, None, "")
+# (epoch second, str) of the most recently formatted wall-clock second.
+_last_second: tuple = (None, "")
+
+
+def format_now() -> str:
+    """
+    Returns the current local time in TIMESTAMP_FORMAT, formatting it only
+    once per second.
+    """
+    global _last_second
+
+    now = int(time.time())
+    if now != _last_second[0]:
+        _last_second = (now, time.strftime(TIMESTAMP_FORMAT, time.localtime(now)))
+    return _last_second[1]
 
-def parse_log_entry(entry: str):
+
+def format_timestamp(timestamp: datetime | str) -> str:
+    """
+    Formats a parsed log timestamp, reusing the previous result while lines
+    keep the same timestamp. Timestamps returned as strings by
+    parse_log_entry are passed through as-is.
+    """
+    global _last_formatted
+
+    if isinstance(timestamp, str):
+        return timestamp
+    # Aware datetimes compare by UTC instant, so the same instant in another
+    # zone must not reuse the previous wall-clock string.
+    last_timestamp, last_tzinfo, formatted = _last_formatted
+    if timestamp != last_timestamp or timestamp.tzinfo != last_tzinfo:
+        formatted = timestamp.strftime(TIMESTAMP_FORMAT)
+        _last_formatted = (timestamp, timestamp.tzinfo, formatted)
+    return formatted
+
+
+def parse_timestamp(timestamp_str: str) -> datetime:
+    """
+    Converts a log timestamp into a datetime, taking the ISO fast path for
+    the '%Y-%m-%d %H:%M:%S' layout and falling back to dateutil otherwise.
+    """
+    global _last_timestamp
+
+    last_str, last_timestamp = _last_timestamp
+    if timestamp_str == last_str:
+        return last_timestamp
+
+    try:
+        timestamp = datetime.fromisoformat(timestamp_str.replace(" ", "T", 1))
+    except ValueError:
+        from dateutil.parser import parse as parse_datetime
+
+        timestamp = parse_datetime(timestamp_str)
+
+    _last_timestamp = (timestamp_str, timestamp)
+    return timestamp
+
+
+def parse_log_entry(entry: bytes):
     """
     Parses a log entry to separate and convert the timestamp from the message.
     It assumes the format is '[timestamp] message'.
 
     Args:
-        entry (str): The raw log line.
+        entry (bytes): The raw log line, as read from the file.
 
     Returns:
-        A tuple containing (datetime_object, message) or (None, original_entry).
+        A tuple containing (timestamp, message) or (None, None) for blank
+        lines. Timestamps already in TIMESTAMP_FORMAT are returned as that
+        string without building a datetime, since they are only written
+        back out; other timestamps are parsed into a datetime.
     """
-    entry = entry.strip()
-    if not entry:
-        return (None, None)
-
-    if entry.startswith("[") and "]" in entry:
-        end_bracket_index = entry.find("]")
-        timestamp_str = entry[1:end_bracket_index]
-        message = entry[end_bracket_index + 1 :].strip()
+    match = _LINE_RE.match(entry)
+    if match is not None:
+        fixed_timestamp, raw_timestamp, raw_message = match.groups()
+        message = raw_message.decode("utf-8", errors="replace") if raw_message else ""
+        if fixed_timestamp is not None:
+            return (fixed_timestamp.decode("ascii"), message)
 
+        timestamp_str = raw_timestamp.decode("utf-8", errors="replace")
         try:
-            timestamp = parse_datetime(timestamp_str)
+            timestamp = parse_timestamp(timestamp_str)
             return (timestamp, message)
         except ValueError:
             logger.error(f"Could not parse timestamp: {timestamp_str}")
             return (timestamp_str, message)
 
-    return (datetime.now(), entry)
+    entry = entry.strip()
+    if not entry:
+        return (None, None)
+
+    return (datetime.now(), entry.decode("utf-8", errors="replace"))
 
 
-def process_log(cache: dict, source_file: Path, message: str, agg_window: timedelta):
+def process_log(
+    cache: "MessageCache",
+    source_file: Path,
+    message: str,
+    agg_window: float,
+    writer: Optional[AggregatedWriter] = None,
+):
     """
-    Checks the cache for logs older than the time window, reports duplicates,
-    and removes them from the cache.
+    Checks the cache for logs older than the time window (in seconds),
+    reports duplicates, and removes them from the cache. `message` must
+    already be cached.
     """
-    from files import dump_log_to_file
-
-    current_time = datetime.now()
-    log_data = cache.get(message)
-    if log_data and current_time - log_data["first_seen"] >= agg_window:
-        if log_data["count"] >= 1:
-            modified = f"{message} (occured {log_data['count']} times)"
+    if time.monotonic() - cache.first_seen[message] >= agg_window:
+        count = cache.pop(message)
+        if count >= 1:
+            modified = f"{message} (occured {count} times)"
             dump_log_to_file(
                 source_file,
-                timestamp=current_time.strftime("%Y-%m-%d %H:%M:%S"),
+                timestamp=format_now(),
                 message=modified,
+                writer=writer,
             )
             logger.debug(f"Dumped '{modified}'")
-        del cache[message]
     else:
-        cache[message]["count"] += 1
+        cache.counts[message] += 1
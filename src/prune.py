@@ -1,12 +1,13 @@
-import threading
+import asyncio
+import contextlib
 import logging
+import time
 
-from datetime import datetime
-from typing import Dict, Any, Optional
-from pathlib import Path
-from files import dump_log_to_file
-
-CacheTree = Dict[Path, Dict[str, Any]]
+from datetime import timedelta
+from typing import Optional
+from files import CacheTree, FilesMap
+from files_io import dump_log_to_file
+from parser import format_now
 
 
 class CachePruner:
@@ -14,32 +15,34 @@ class CachePruner:
         self,
         cache: CacheTree,
         dt_window,
-        lock: Optional[threading.lock] = None,
         interval: float = 5.0,
+        files_map: Optional[FilesMap] = None,
     ):
         self.cache = cache
-        self.dt_window = dt_window
-        self.lock = lock or threading.Lock()
-        self.interval = float(interval)
-        self._stop_event = threading.Event()
-        self._thread = threading.Thread(
-            target=self._worker, name="log-cache-pruner", daemon=True
+        self.files_map = files_map if files_map is not None else {}
+        self.dt_window = (
+            dt_window.total_seconds()
+            if isinstance(dt_window, timedelta)
+            else float(dt_window)
         )
+        self.interval = float(interval)
+        self._task: Optional[asyncio.Task] = None
 
     def start(self):
-        if not self._thread.is_alive():
-            self._stop_event.clear()
-            self._thread = threading.Thread(
-                target=self._worker, name="log-cache-pruner", daemon=True
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(
+                self._worker(), name="log-cache-pruner"
             )
-            self._thread.start()
 
-    def stop(self, timeout: float = 1.0):
-        self._stop_event.set()
-        self._thread.join(timeout=timeout)
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
 
-    def _worker(self):
-        while not self._stop_event.wait(self.interval):
+    async def _worker(self):
+        while True:
+            await asyncio.sleep(self.interval)
             self.prune_once()
 
     def prune_once(self):
@@ -48,27 +51,23 @@ class CachePruner:
         For entries with count > 1 we print the report before removing.
         """
         logger = logging.getLogger(__name__)
-        now = datetime.now()
-        to_remove = []
-        with self.lock:
-            for path, cache in list(self.cache.items()):
-                for msg, data in list(cache.items()):
-                    first_seen = (
-                        data.get("first_seen") if isinstance(data, dict) else None
+        now = time.monotonic()
+        timestamp = format_now()
+        for path, cache in self.cache.items():
+            writer = self.files_map.get(path)
+            for msg, cnt in cache.sweep(now - self.dt_window):
+                if cnt > 1:
+                    dump_log_to_file(
+                        path,
+                        timestamp,
+                        f"{msg} (occurred {cnt} times)",
+                        writer=writer,
                     )
-                    if first_seen is None:
-                        to_remove.append((path, msg, data))
-                        continue
-                    if now - first_seen > self.dt_window:
-                        to_remove.append((path, msg, data))
-            for path, msg, data in to_remove:
-                removed = self.cache[path].pop(msg, None)
-                if removed:
-                    cnt = removed.get("count", 0)
-                    if cnt > 1:
-                        dump_log_to_file(
-                            path,
-                            now.strftime("%Y-%m-%d %H:%M:%S"),
-                            f"{msg} (occurred {cnt} times)",
-                        )
-                        logger.debug(f"Pruned '{msg} (occurred {cnt} times)'")
+                    logger.debug(f"Pruned '{msg} (occurred {cnt} times)'")
+            # The tailer only flushes after reading new lines, so reports for
+            # a quiet file would otherwise wait in the buffer.
+            if writer is not None and not writer.closed:
+                try:
+                    writer.flush()
+                except OSError as e:
+                    logger.error(f"Failed to flush aggregated log for {path}: {e}")
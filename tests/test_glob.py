@@ -0,0 +1,91 @@
+import glob
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from files import GlobCache, discover_files  # noqa: E402
+
+FILES = [
+    "logs/top.log",
+    "logs/.hidden.log",
+    "logs/svc_a/app.log",
+    "logs/svc_a/app-agg.log",
+    "logs/svc_a/nested/deep.log",
+    "logs/svc_b/app.log",
+    "logs/svc_b/notes.txt",
+    "logs/.cache/svc_c/app.log",
+]
+
+PATTERNS = [
+    # '**' at the head, in the middle and at the tail.
+    "**/*.log",
+    "logs/**/*.log",
+    "logs/**/nested/*.log",
+    "logs/**",
+    "logs/**/",
+    # Literal segments.
+    "logs/svc_a/app.log",
+    "logs/svc_a/nested",
+    "logs/svc_a/nested/",
+    "logs/missing.log",
+    # Wildcards and hidden names.
+    "logs/*",
+    "logs/*/",
+    "logs/*/*.log",
+    "logs/svc_?/*.log",
+    "logs/.*",
+    "logs/.cache/*/*.log",
+    "logs/.cache/**",
+]
+
+
+@pytest.fixture
+def tree(tmp_path, monkeypatch):
+    for name in FILES:
+        path = tmp_path / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.touch()
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+@pytest.mark.parametrize("pattern", PATTERNS)
+def test_glob_matches_stdlib(tree, pattern):
+    expected = sorted(glob.glob(pattern, recursive=True))
+    assert sorted(GlobCache().glob(pattern)) == expected
+
+
+@pytest.mark.parametrize("pattern", PATTERNS)
+def test_glob_matches_stdlib_absolute(tree, pattern):
+    pattern = os.path.join(str(tree), pattern)
+    expected = sorted(glob.glob(pattern, recursive=True))
+    assert sorted(GlobCache().glob(pattern)) == expected
+
+
+def test_glob_cache_sees_new_files(tree):
+    cache = GlobCache()
+    assert sorted(cache.glob("logs/*/*.log")) == sorted(
+        glob.glob("logs/*/*.log", recursive=True)
+    )
+    (tree / "logs/svc_d").mkdir()
+    (tree / "logs/svc_d/new.log").touch()
+    assert sorted(cache.glob("logs/*/*.log")) == sorted(
+        glob.glob("logs/*/*.log", recursive=True)
+    )
+
+
+def test_discover_files_excludes_aggregated(tree):
+    found = discover_files(["logs/**/*.log", "logs/svc_a/app-agg.log"])
+    assert sorted(found) == sorted(
+        (tree / name).resolve()
+        for name in [
+            "logs/top.log",
+            "logs/svc_a/app.log",
+            "logs/svc_a/nested/deep.log",
+            "logs/svc_b/app.log",
+        ]
+    )